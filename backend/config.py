@@ -1,5 +1,7 @@
 import os
 import logging
+import tempfile
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 from pydantic_settings import BaseSettings
@@ -22,10 +24,22 @@ class Settings(BaseSettings):
     QDRANT_PORT: int = 6333
     QDRANT_URL: Optional[str] = None  # For cloud setup, overrides host/port
     QDRANT_API_KEY: Optional[str] = None  # Optional for local setup
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = True  # Binary gRPC transport for searches and upserts
+    QDRANT_TIMEOUT: int = 60  # Seconds
     
     # Uploads directory for storing PDF files
     UPLOADS_DIR: str = "uploads"
     
+    # Table extractor for PDFs: "tabula" (Java) or "pdfplumber" (pure Python, no JVM)
+    PDF_EXTRACTOR: str = "tabula"
+    
+    # Cache of PDF extraction results, keyed by the SHA-256 of the PDF bytes
+    PDF_CACHE_DIR: str = "pdf_cache"
+    
+    # Optional scratch directory for per-request temp files, e.g. a tmpfs mount like "/dev/shm/bm-ai"
+    UPLOAD_SCRATCH_DIR: Optional[str] = None
+    
     class Config:
         env_file = ".env"
         extra = "ignore"  # Ignore extra environment variables
@@ -38,20 +52,40 @@ class Settings(BaseSettings):
             return False
         return True
 
-# Initialize settings
-try:
-    settings = Settings()
-    logger.info("Configuration loaded successfully")
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Load settings once and reuse the cached instance"""
+    try:
+        settings = Settings()
+        logger.info("Configuration loaded successfully")
+    except Exception as e:
+        logger.error(f"Error loading configuration: {e}")
+        # Create minimal settings for startup
+        settings = Settings(GOOGLE_API_KEY=None)
     
     # Validate settings but don't fail startup
     settings.validate_required_settings()
-    
-    # Create uploads directory if it doesn't exist
-    uploads_path = Path(settings.UPLOADS_DIR)
-    uploads_path.mkdir(exist_ok=True)
-    logger.info(f"Uploads directory: {uploads_path.absolute()}")
+    return settings
+
+# Initialize settings
+settings = get_settings()
+
+try:
+    # Create uploads directory, ignoring the error if it already exists
+    try:
+        os.mkdir(settings.UPLOADS_DIR)
+    except FileExistsError:
+        pass
+    logger.info(f"Uploads directory: {Path(settings.UPLOADS_DIR).absolute()}")
     
 except Exception as e:
-    logger.error(f"Error loading configuration: {e}")
-    # Create minimal settings for startup
-    settings = Settings(GOOGLE_API_KEY=None)
\ No newline at end of file
+    logger.error(f"Error creating uploads directory: {e}")
+
+# Point temp files (upload spools, per-request work dirs) at the scratch directory
+if settings.UPLOAD_SCRATCH_DIR:
+    try:
+        os.makedirs(settings.UPLOAD_SCRATCH_DIR, exist_ok=True)
+        tempfile.tempdir = settings.UPLOAD_SCRATCH_DIR
+        logger.info(f"Scratch directory: {settings.UPLOAD_SCRATCH_DIR}")
+    except Exception as e:
+        logger.error(f"Error creating scratch directory, using system temp directory: {e}")
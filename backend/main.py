@@ -1,8 +1,22 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import upload, chat, files
+from services.vector_store import get_vector_store_service
+from services.chat_service import get_chat_service
 
-app = FastAPI(title="Building Manager RAG Chatbot")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect to Qdrant and build the QA chain before the first request arrives"""
+    # Both services are created lazily; build the vector store first since the QA chain uses it
+    vector_store_service = await asyncio.to_thread(get_vector_store_service)
+    await asyncio.to_thread(vector_store_service.warm_up)
+    chat_service = await asyncio.to_thread(get_chat_service)
+    await asyncio.to_thread(chat_service.warm_up)
+    yield
+
+app = FastAPI(title="Building Manager RAG Chatbot", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -1,14 +1,18 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional, Dict, Any
 
 class ChatRequest(BaseModel):
     question: str
 
 class Source(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     filename: str
     pdf_path: Optional[str] = None
 
 class ChatResponse(BaseModel):
+    model_config = ConfigDict(frozen=True)
+    
     answer: str
     sources: List[Source]
     enhanced_question: Optional[str] = None  # Add this line
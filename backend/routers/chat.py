@@ -1,18 +1,31 @@
 from fastapi import APIRouter
-from services.chat_service import chat_service
-from models.schemas import ChatRequest, ChatResponse
+from fastapi.responses import StreamingResponse
+from services.chat_service import get_chat_service
+from models.schemas import ChatRequest, ChatResponse, Source
+import orjson
 
 router = APIRouter()
 
-@router.post("/chat", response_model=ChatResponse)
+@router.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
 async def chat(request: ChatRequest):
-    result = await chat_service.get_answer(request.question)  # Added await here
-    return ChatResponse(
+    result = await get_chat_service().get_answer(request.question)  # Added await here
+    # Values come from our own service, so skip re-validating them here
+    return ChatResponse.model_construct(
         answer=result["answer"],
-        sources=result["sources"],
-        enhanced_question=result.get("enhanced_question", "")  # Added enhanced_question
+        # Sources must be models too, or serialization warns and exclude_none can't reach them
+        sources=[Source.model_construct(**source) for source in result["sources"]],
+        enhanced_question=result.get("enhanced_question")  # Added enhanced_question
     )
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Stream the answer as newline-delimited JSON events: tokens first, then the sources"""
+    async def events():
+        async for event in get_chat_service().stream_answer(request.question):
+            yield orjson.dumps(event) + b"\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @router.get("/health")
 async def health_check():
     return {"status": "healthy"}
\ No newline at end of file
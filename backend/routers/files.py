@@ -1,35 +1,70 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import FileResponse
-from config import settings, logger
+from config import Settings, get_settings, logger
+from functools import lru_cache
+from pathlib import Path
 import os
+import stat
 
 router = APIRouter()
 
+# Media type and disposition per extension; PDFs display inline in the browser, others download
+_EXT_META = {
+    '.pdf': ("application/pdf", "inline"),
+    '.xlsx': ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "attachment"),
+    '.xls': ("application/vnd.ms-excel", "attachment"),
+}
+_DEFAULT_EXT_META = ("application/octet-stream", "attachment")
+
+
+@lru_cache(maxsize=None)
+def _resolve_uploads_root(uploads_dir: str) -> Path:
+    """Resolve the uploads directory once instead of on every request"""
+    return Path(uploads_dir).resolve()
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches the ETag, using weak comparison (RFC 9110)"""
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
 @router.get("/files/{filename}")
-async def get_file(filename: str):
-    file_path = os.path.join(settings.UPLOADS_DIR, filename)
+async def get_file(filename: str, request: Request, settings: Settings = Depends(get_settings)):
+    uploads_root = _resolve_uploads_root(settings.UPLOADS_DIR)
+    file_path = (uploads_root / filename).resolve()
     
     # Security check
-    abs_file_path = os.path.abspath(file_path)
-    abs_uploads_dir = os.path.abspath(settings.UPLOADS_DIR)
-    
-    if not abs_file_path.startswith(abs_uploads_dir):
+    if not file_path.is_relative_to(uploads_root):
         raise HTTPException(status_code=403, detail="Access denied")
     
-    # Check if file exists
-    if not os.path.exists(file_path):
+    # Check if file exists; the stat result is reused by FileResponse
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not stat.S_ISREG(st.st_mode):
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Determine content type based on file extension
-    file_ext = os.path.splitext(filename)[1].lower()
-    media_type = "application/pdf" if file_ext == '.pdf' else "application/octet-stream"
+    # Stored uploads never change in place, so mtime and size identify a version
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    cache_headers = {"ETag": etag, "Cache-Control": "public, max-age=3600"}
     
-    # For PDFs, use inline to display in browser, for others, download
-    content_disposition = f"inline; filename={filename}" if file_ext == '.pdf' else f"attachment; filename={filename}"
+    # Let the browser reuse its cached copy
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+    
+    # Determine content type and disposition based on file extension
+    file_ext = os.path.splitext(filename)[1].lower()
+    media_type, disposition = _EXT_META.get(file_ext, _DEFAULT_EXT_META)
+    content_disposition = f"{disposition}; filename={filename}"
     
     return FileResponse(
         path=file_path,
         media_type=media_type,
         filename=filename,
-        headers={"Content-Disposition": content_disposition}
+        stat_result=st,
+        headers={"Content-Disposition": content_disposition, **cache_headers}
     )
\ No newline at end of file
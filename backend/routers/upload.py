@@ -1,69 +1,180 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Form
-from services.excel_processer import process_excel_to_documents, process_pdf_folder_to_documents, process_mixed_folder_to_documents
-from services.pdf_processor import PDFProcessor
-from services.vector_store import vector_store_service
+from services.excel_processer import process_excel_to_documents, process_pdf_folder_to_documents, process_mixed_folder_to_documents, store_pdf
+from services.pdf_processor import init_pdf_worker, get_worker_processor
+from services.vector_store import get_vector_store_service
 from services.document_utils import (
     create_documents_from_extracted_data,
     collect_files_from_directory,
     get_file_type,
-    FileProcessingStats
+    FileProcessingStats,
+    POOL_MP_CONTEXT
 )
 from models.schemas import UploadResponse, FolderUploadResponse, FileProcessingResult
-from typing import List, Optional
+from langchain_core.documents import Document
+from typing import List, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
 import tempfile
 import os
-import shutil
 import zipfile
 from pathlib import Path
 import os
-from config import settings, logger
-import uuid
+from config import logger
 
 router = APIRouter()
 
+# Supported upload extensions, lowercased and without the leading dot
+_ALLOWED_EXTENSIONS = frozenset({'pdf', 'xlsx', 'xls'})
+
+# Copy uploads in 1 MiB chunks so memory stays bounded regardless of file size
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Number of document chunks sent to the vector store per insert
+VECTOR_STORE_BATCH_SIZE = 512
+
+
+def _new_process_pool() -> ProcessPoolExecutor:
+    """Create the worker pool used for PDF and Excel parsing"""
+    return ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        initializer=init_pdf_worker,
+        mp_context=POOL_MP_CONTEXT
+    )
+
+
+# Worker pool for CPU-heavy PDF (tabula) and Excel parsing; each worker builds its
+# PDFProcessor once at startup and reuses it for every task. All parsing runs here,
+# so the server process itself never starts a JVM
+_process_pool = _new_process_pool()
+
+
+async def _run_in_pool(func, *args):
+    """
+    Run func on the worker pool, replacing the pool once if a worker has died.
+    A crashed worker (e.g. the JVM segfaulting or the OOM killer) breaks the whole
+    pool, so without this every later upload would fail until a restart.
+    """
+    global _process_pool
+    loop = asyncio.get_running_loop()
+    pool = _process_pool
+    try:
+        return await loop.run_in_executor(pool, func, *args)
+    except BrokenProcessPool:
+        # Concurrent callers see the same broken pool; only the first replaces it
+        if _process_pool is pool:
+            logger.error("Worker process pool broke, starting a new one")
+            _process_pool = _new_process_pool()
+            pool.shutdown(wait=False)
+        return await loop.run_in_executor(_process_pool, func, *args)
+
+
+async def _process_one_in_pool(file_path: str) -> Tuple[str, str, bool, Union[List[Document], str]]:
+    """Run _process_one on the worker pool, reporting a crashed worker as a per-file failure"""
+    try:
+        return await _run_in_pool(_process_one, file_path)
+    except BrokenProcessPool:
+        filename = os.path.basename(file_path)
+        file_type = 'pdf' if _file_extension(filename) == 'pdf' else 'excel'
+        return filename, file_type, False, "Worker process crashed while processing this file"
+
+
+def _file_extension(filename: str) -> str:
+    """Return the lowercased extension of a filename without the dot, or '' if it has none"""
+    _, dot, ext = filename.rpartition('.')
+    return ext.lower() if dot else ''
+
+
+def _save_upload(file: UploadFile, file_path: str):
+    """Stream an uploaded file to disk in bounded chunks using raw file descriptor writes"""
+    file.file.seek(0)
+    fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+            view = memoryview(chunk)
+            while view:
+                written = os.write(fd, view)
+                view = view[written:]
+    finally:
+        os.close(fd)
+
+
+def _unique_upload_paths(filenames: List[str], directory: str) -> List[str]:
+    """
+    Map uploaded filenames to distinct paths in a flat directory.
+    Folder uploads can hold the same name in different subfolders, so repeats
+    get a numbered suffix, e.g. "log.pdf" then "log (1).pdf".
+    """
+    taken = set()
+    paths = []
+    for filename in filenames:
+        name = os.path.basename(filename)
+        stem, ext = os.path.splitext(name)
+        counter = 1
+        while name.lower() in taken:
+            name = f"{stem} ({counter}){ext}"
+            counter += 1
+        taken.add(name.lower())
+        paths.append(os.path.join(directory, name))
+    return paths
+
+
+async def _add_documents_in_batches(documents: List[Document]):
+    """Add documents to the vector store in fixed-size batches"""
+    vector_store_service = get_vector_store_service()
+    for start in range(0, len(documents), VECTOR_STORE_BATCH_SIZE):
+        await vector_store_service.aadd_documents(documents[start:start + VECTOR_STORE_BATCH_SIZE])
+
+
+def _process_upload(file_path: str, filename: str, stored_filename: Optional[str]) -> List[Document]:
+    """
+    Parse a single uploaded file into documents.
+    Runs inside a worker process, so it must stay a module-level function.
+    
+    Args:
+        file_path: Path of the saved upload
+        filename: Original filename, used in document metadata
+        stored_filename: Name of the stored PDF in the uploads directory, or None for Excel files
+    """
+    if stored_filename is None:
+        return process_excel_to_documents(file_path)
+    
+    extracted_data = get_worker_processor().process_single_pdf(file_path)[1]
+    if not extracted_data:
+        return []
+    
+    return create_documents_from_extracted_data(
+        extracted_data, 
+        filename, 
+        "pdf_extraction", 
+        {"original_format": "pdf", "pdf_path": stored_filename}
+    )
+
+
 @router.post("/upload", response_model=UploadResponse)
 async def upload_file(file: UploadFile = File(...)):
     # Validate file type
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    file_ext = _file_extension(file.filename)
     logger.info(f"Received file with extension: {file_ext}")
-    if file_ext not in ['.xlsx', '.xls', '.pdf']:
+    if file_ext not in _ALLOWED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="Only Excel (.xlsx, .xls) and PDF files are supported")
     
     try:
         # Save uploaded file temporarily
         suffix = f'.{file_ext}'
         with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-            content = await file.read()
-            tmp_file.write(content)
             tmp_file_path = tmp_file.name
+        await asyncio.to_thread(_save_upload, file, tmp_file_path)
         
-        # Process the file based on type
-        if file_ext == '.pdf':
-            # Store PDF file permanently
-            stored_filename = f"{uuid.uuid4()}_{file.filename}"
-            stored_path = os.path.join(settings.UPLOADS_DIR, stored_filename)
-            shutil.copy2(tmp_file_path, stored_path)
-            
-            # Process PDF file
-            pdf_processor = PDFProcessor()
-            extracted_data = pdf_processor.process_single_pdf(tmp_file_path)[1]
-            
-            if extracted_data:
-                documents = create_documents_from_extracted_data(
-                    extracted_data, 
-                    file.filename, 
-                    "pdf_extraction", 
-                    {"original_format": "pdf", "pdf_path": stored_filename}
-                )
-            else:
-                documents = []
-        else:
-            # Process Excel file
-            documents = process_excel_to_documents(tmp_file_path)
+        # Store PDF file permanently
+        stored_filename = store_pdf(tmp_file_path, file.filename) if file_ext == 'pdf' else None
+        
+        # Parse the file on the worker pool
+        documents = await _run_in_pool(_process_upload, tmp_file_path, file.filename, stored_filename)
         
         # Add to vector store
         if documents:
-            vector_store_service.add_documents(documents)
+            await get_vector_store_service().aadd_documents(documents)
         
         # Clean up temporary file
         os.unlink(tmp_file_path)
@@ -89,43 +200,33 @@ async def upload_folder(files: List[UploadFile] = File(...)):
     if not files:
         raise HTTPException(status_code=400, detail="No files provided")
     
-    # Create temporary directory for processing
-    temp_dir = tempfile.mkdtemp()
-    
     try:
-        # Save all uploaded files to temporary directory
-        saved_files = []
-        for file in files:
-            if not file.filename:
-                continue
-                
+        # Create temporary directory for processing; removed when the block exits
+        with tempfile.TemporaryDirectory() as temp_dir:
             # Validate file types
-            if not file.filename.lower().endswith(('.pdf', '.xlsx', '.xls')):
-                continue
-                
-            file_path = os.path.join(temp_dir, file.filename)
-            content = await file.read()
+            valid_files = [
+                file for file in files
+                if file.filename and _file_extension(file.filename) in _ALLOWED_EXTENSIONS
+            ]
             
-            with open(file_path, 'wb') as f:
-                f.write(content)
+            if not valid_files:
+                raise HTTPException(status_code=400, detail="No valid PDF or Excel files found")
             
-            saved_files.append((file.filename, file_path))
-        
-        if not saved_files:
-            raise HTTPException(status_code=400, detail="No valid PDF or Excel files found")
-        
-        # Process the folder
-        result = await process_folder_files(temp_dir)
+            # Stream all uploaded files to the temporary directory concurrently. Each file
+            # gets its own path, since parallel writes to a shared name would interleave
+            file_paths = _unique_upload_paths([file.filename for file in valid_files], temp_dir)
+            await asyncio.gather(*(
+                asyncio.to_thread(_save_upload, file, file_path)
+                for file, file_path in zip(valid_files, file_paths)
+            ))
+            
+            # Process the folder
+            result = await process_folder_files(temp_dir)
         
         return result
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing folder: {str(e)}")
-    
-    finally:
-        # Clean up temporary directory
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
 
 
 @router.post("/upload_zip_folder", response_model=FolderUploadResponse)
@@ -137,250 +238,174 @@ async def upload_zip_folder(file: UploadFile = File(...)):
     if not file.filename or not file.filename.lower().endswith('.zip'):
         raise HTTPException(status_code=400, detail="Only ZIP files are supported")
     
-    # Create temporary directories
-    temp_dir = tempfile.mkdtemp()
-    extract_dir = os.path.join(temp_dir, 'extracted')
-    
     try:
-        # Save uploaded ZIP file
-        zip_path = os.path.join(temp_dir, file.filename)
-        content = await file.read()
-        
-        with open(zip_path, 'wb') as f:
-            f.write(content)
-        
-        # Extract ZIP file
-        logger.info(f"Extracting ZIP file: {file.filename}")
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_dir)
-        
-        # Process the extracted files (PDF and Excel)
-        result = await process_zip_folder(extract_dir)
+        # Create temporary directory for extracted entries; removed when the block exits
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Open the ZIP file straight from the spooled upload instead of copying it to disk
+            logger.info(f"Reading ZIP file: {file.filename}")
+            file.file.seek(0)
+            with zipfile.ZipFile(file.file, 'r') as zip_ref:
+                # Process the archived files (PDF and Excel)
+                result = await process_zip_archive(zip_ref, temp_dir)
         
         return result
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing ZIP file: {str(e)}")
-    
-    finally:
-        # Clean up temporary directory
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
 
 
-async def process_zip_folder(folder_path: str) -> FolderUploadResponse:
+async def process_zip_archive(zip_ref: zipfile.ZipFile, extract_dir: str) -> FolderUploadResponse:
     """
-    Process all PDF and Excel files in a folder using the same logic as single file upload.
-    Each file type is processed with its respective working logic.
+    Process all PDF and Excel files in a ZIP archive using the same logic as folder upload.
+    Entries are extracted on a thread and processed concurrently on the worker process pool.
     """
-    pdf_processor = PDFProcessor()
-    file_results = []
-    total_documents = 0
-    successful_files = 0
-    failed_files = 0
-    processing_summary = {'pdf': 0, 'excel': 0}
-    
-    # Get all PDF and Excel files in the folder (including subdirectories)
-    all_files = []
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            file_lower = file.lower()
-            if file_lower.endswith('.pdf') or file_lower.endswith(('.xlsx', '.xls')):
-                all_files.append(os.path.join(root, file))
+    # Get all PDF and Excel entries in the archive (including subdirectories)
+    all_entries = [
+        info for info in zip_ref.infolist()
+        if not info.is_dir() and _file_extension(info.filename) in _ALLOWED_EXTENSIONS
+    ]
     
-    logger.info(f"Found {len(all_files)} files to process (PDF and Excel)")
+    logger.info(f"Found {len(all_entries)} files to process (PDF and Excel)")
     
-    if not all_files:
+    if not all_entries:
         raise HTTPException(status_code=400, detail="No PDF or Excel files found in the ZIP archive")
     
-    # Process each file using the same logic as single file upload
-    for file_path in all_files:
-        filename = os.path.basename(file_path)
-        file_ext = os.path.splitext(filename)[1].lower()
+    semaphore = asyncio.Semaphore(os.cpu_count() or 1)
+    extract_lock = asyncio.Lock()
+    
+    async def handle(info: zipfile.ZipInfo):
+        async with semaphore:
+            try:
+                # Entries share one archive handle, so extract them one at a time
+                # while earlier entries are still being parsed on the pool
+                async with extract_lock:
+                    file_path = await asyncio.to_thread(zip_ref.extract, info, extract_dir)
+            except Exception as e:
+                filename = os.path.basename(info.filename)
+                file_type = 'pdf' if _file_extension(filename) == 'pdf' else 'excel'
+                return filename, file_type, False, str(e)
+            
+            return await _process_one_in_pool(file_path)
+    
+    results = await asyncio.gather(*map(handle, all_entries))
+    
+    return await _build_folder_response(results)
+
+
+def _process_one(file_path: str) -> Tuple[str, str, bool, Union[List[Document], str]]:
+    """
+    Process a single PDF or Excel file into documents.
+    Runs inside a worker process, so it must stay a module-level function.
+    
+    Returns:
+        Tuple of (filename, file_type, success, documents or error message)
+    """
+    filename = os.path.basename(file_path)
+    file_type = 'pdf' if _file_extension(filename) == 'pdf' else 'excel'
+    
+    try:
+        if file_type == 'pdf':
+            # Store PDF file permanently
+            stored_filename = store_pdf(file_path, filename)
+            
+            # Process PDF file
+            success, extracted_data, excel_path = get_worker_processor().process_single_pdf(file_path)
+            
+            if not (success and extracted_data):
+                return filename, file_type, False, "Failed to extract data from PDF"
+            
+            # Convert to documents using shared utility
+            documents = create_documents_from_extracted_data(
+                extracted_data, 
+                filename, 
+                "pdf_extraction", 
+                {"original_format": "pdf", "pdf_path": stored_filename}
+            )
+        else:  # Excel file
+            # Process Excel file directly
+            documents = process_excel_to_documents(file_path)
         
-        try:
-            if file_ext == '.pdf':
-                # Store PDF file permanently
-                stored_filename = f"{uuid.uuid4()}_{filename}"
-                stored_path = os.path.join(settings.UPLOADS_DIR, stored_filename)
-                shutil.copy2(file_path, stored_path)
-                
-                # Process PDF file - same as single file upload
-                extracted_data = pdf_processor.process_single_pdf(file_path)[1]
-                
-                if extracted_data:
-                    # Convert to documents - same as single file upload
-                    documents = create_documents_from_extracted_data(
-                        extracted_data, 
-                        filename, 
-                        "pdf_extraction", 
-                        {"original_format": "pdf", "pdf_path": stored_filename}
-                    )
-                    
-                    # Add to vector store - same as single file upload
-                    vector_store_service.add_documents(documents)
-                    
-                    file_results.append(FileProcessingResult(
-                        filename=filename,
-                        success=True,
-                        documents_processed=len(documents),
-                        file_type='pdf'
-                    ))
-                    
-                    total_documents += len(documents)
-                    successful_files += 1
-                    processing_summary['pdf'] += 1
-                    logger.info(f"Successfully processed PDF: {filename} ({len(documents)} documents)")
-                else:
-                    file_results.append(FileProcessingResult(
-                        filename=filename,
-                        success=False,
-                        documents_processed=0,
-                        error_message="No data extracted from PDF",
-                        file_type='pdf'
-                    ))
-                    failed_files += 1
-                    logger.warning(f"No data extracted from PDF: {filename}")
-                    
-            elif file_ext in ['.xlsx', '.xls']:
-                # Process Excel file - same as single file upload
-                documents = process_excel_to_documents(file_path)
-                
-                # Add to vector store - same as single file upload
-                if documents:
-                    vector_store_service.add_documents(documents)
-                
-                file_results.append(FileProcessingResult(
-                    filename=filename,
-                    success=True,
-                    documents_processed=len(documents) if documents else 0,
-                    file_type='excel'
-                ))
-                
-                total_documents += len(documents) if documents else 0
-                successful_files += 1
-                processing_summary['excel'] += 1
-                logger.info(f"Successfully processed Excel: {filename} ({len(documents) if documents else 0} documents)")
-                
-        except Exception as e:
-            file_type = 'pdf' if file_ext == '.pdf' else 'excel'
-            file_results.append(FileProcessingResult(
-                filename=filename,
-                success=False,
-                documents_processed=0,
-                error_message=str(e),
-                file_type=file_type
-            ))
-            failed_files += 1
-            logger.error(f"Failed to process {filename}: {str(e)}")
+        return filename, file_type, True, documents
     
-    return FolderUploadResponse(
-        message=f"Processed {len(all_files)} files: {successful_files} successful, {failed_files} failed",
-        total_files_processed=len(all_files),
-        successful_files=successful_files,
-        failed_files=failed_files,
-        total_documents_processed=total_documents,
-        file_results=file_results,
-        processing_summary=processing_summary
-    )
+    except Exception as e:
+        return filename, file_type, False, str(e)
 
 
 async def process_folder_files(folder_path: str, max_files: Optional[int] = None) -> FolderUploadResponse:
     """
     Process all PDF and Excel files in a folder and return detailed results.
+    Files are processed in parallel on the worker process pool.
     """
-    processor = PDFProcessor()
-    file_results = []
-    total_documents = 0
-    successful_files = 0
-    failed_files = 0
-    processing_summary = {'pdf': 0, 'excel': 0}
-    
-    # Get all files in the folder
-    all_files = []
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if file.lower().endswith(('.pdf', '.xlsx', '.xls')):
-                all_files.append(os.path.join(root, file))
+    # Get all files in the folder (uploads are saved flat, so no recursion needed)
+    with os.scandir(folder_path) as entries:
+        all_files = [
+            entry.path for entry in entries
+            if entry.is_file(follow_symlinks=False) and _file_extension(entry.name) in _ALLOWED_EXTENSIONS
+        ]
     
     # Limit files if specified
     if max_files:
         all_files = all_files[:max_files]
     
-    # Process each file
-    for file_path in all_files:
-        filename = os.path.basename(file_path)
-        file_type = 'pdf' if filename.lower().endswith('.pdf') else 'excel'
+    # Process all files concurrently on the worker pool
+    results = await asyncio.gather(*(
+        _process_one_in_pool(file_path)
+        for file_path in all_files
+    ))
+    
+    return await _build_folder_response(results)
+
+
+async def _build_folder_response(results: List[Tuple[str, str, bool, Union[List[Document], str]]]) -> FolderUploadResponse:
+    """
+    Add the documents from processed files to the vector store and summarize the results.
+    
+    Args:
+        results: List of (filename, file_type, success, documents or error message) tuples
         
-        try:
-            if file_type == 'pdf':
-                # Store PDF file permanently
-                stored_filename = f"{uuid.uuid4()}_{filename}"
-                stored_path = os.path.join(settings.UPLOADS_DIR, stored_filename)
-                shutil.copy2(file_path, stored_path)
-                
-                # Process PDF file
-                success, extracted_data, excel_path = processor.process_single_pdf(file_path)
-                
-                if success and extracted_data:
-                    # Convert to documents and add to vector store using shared utility
-                    documents = create_documents_from_extracted_data(
-                        extracted_data, 
-                        filename, 
-                        "pdf_extraction", 
-                        {"original_format": "pdf", "pdf_path": stored_filename}
-                    )
-                    vector_store_service.add_documents(documents)
-                    
-                    file_results.append(FileProcessingResult(
-                        filename=filename,
-                        success=True,
-                        documents_processed=len(documents),
-                        file_type=file_type
-                    ))
-                    
-                    total_documents += len(documents)
-                    successful_files += 1
-                    processing_summary['pdf'] += 1
-                else:
-                    file_results.append(FileProcessingResult(
-                        filename=filename,
-                        success=False,
-                        documents_processed=0,
-                        error_message="Failed to extract data from PDF",
-                        file_type=file_type
-                    ))
-                    failed_files += 1
-                    
-            else:  # Excel file
-                # Process Excel file directly
-                documents = process_excel_to_documents(file_path)
-                vector_store_service.add_documents(documents)
-                
-                file_results.append(FileProcessingResult(
-                    filename=filename,
-                    success=True,
-                    documents_processed=len(documents),
-                    file_type=file_type
-                ))
-                
-                total_documents += len(documents)
-                successful_files += 1
-                processing_summary['excel'] += 1
-                
-        except Exception as e:
+    Returns:
+        FolderUploadResponse: Per-file results and totals
+    """
+    file_results = []
+    total_documents = 0
+    successful_files = 0
+    failed_files = 0
+    processing_summary = {'pdf': 0, 'excel': 0}
+    
+    # Collect documents from all successful files
+    all_documents = []
+    for filename, file_type, success, outcome in results:
+        if success:
+            all_documents.extend(outcome)
+            
+            file_results.append(FileProcessingResult(
+                filename=filename,
+                success=True,
+                documents_processed=len(outcome),
+                file_type=file_type
+            ))
+            
+            total_documents += len(outcome)
+            successful_files += 1
+            processing_summary[file_type] += 1
+            logger.info(f"Successfully processed {file_type}: {filename} ({len(outcome)} documents)")
+        else:
             file_results.append(FileProcessingResult(
                 filename=filename,
                 success=False,
                 documents_processed=0,
-                error_message=str(e),
+                error_message=outcome,
                 file_type=file_type
             ))
             failed_files += 1
+            logger.error(f"Failed to process {filename}: {outcome}")
+    
+    # Add to vector store in bulk, serially to avoid concurrent Qdrant writes
+    await _add_documents_in_batches(all_documents)
     
     return FolderUploadResponse(
-        message=f"Processed {len(all_files)} files: {successful_files} successful, {failed_files} failed",
-        total_files_processed=len(all_files),
+        message=f"Processed {len(results)} files: {successful_files} successful, {failed_files} failed",
+        total_files_processed=len(results),
         successful_files=successful_files,
         failed_files=failed_files,
         total_documents_processed=total_documents,
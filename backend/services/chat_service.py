@@ -1,9 +1,152 @@
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_classic.chains import RetrievalQA
 from langchain_classic.prompts import PromptTemplate
-from services.vector_store import vector_store_service
+from services.vector_store import get_vector_store_service
 from config import settings, logger
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, AsyncIterator, Hashable, List, Optional, Tuple
+import numpy as np
+import asyncio
+import re
+
+# Number of questions kept in each in-memory cache
+CACHE_SIZE = 512
+
+# Minimum cosine similarity for a past question to count as a paraphrase
+SEMANTIC_CACHE_THRESHOLD = 0.95
+
+# Numbers and calendar words; two questions differing in any of these ask about different shifts
+_DATE_TOKEN_RE = re.compile(
+    r"\d+|\b(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec|january|february|march|april|june|july"
+    r"|august|september|october|november|december|monday|tuesday|wednesday|thursday|friday|saturday|sunday"
+    r"|today|yesterday|tomorrow|week|month|year)\b"
+)
+
+# Minimum share of the raw question's words found in the enhanced query for the speculative
+# retrieval to be kept. Enhancement appends synonyms and context, so extra words don't count against it
+SPECULATIVE_OVERLAP_THRESHOLD = 0.8
+
+# Questions shorter than this are sent as-is unless they contain an ambiguous reference
+ENHANCEMENT_MIN_LENGTH = 40
+_AMBIGUOUS_WORDS = frozenset({"it", "they", "this", "that", "those"})
+
+
+class LRUCache:
+    """
+    Minimal in-memory LRU cache. Only used from the event loop, so no locking is needed.
+    """
+    
+    def __init__(self, maxsize: int = CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value and mark it as recently used, or None on a miss."""
+        if key not in self._entries:
+            return None
+        self._entries.move_to_end(key)
+        return self._entries[key]
+    
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry when full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class SemanticCache:
+    """
+    Cache of answers keyed by question embedding, so paraphrased questions reuse an answer.
+    Embeddings are L2-normalized, so a single matrix-vector product gives cosine similarities.
+    A flat search is used because the cache is small (a few hundred vectors).
+    Embeddings barely move when only a date or number changes, so a hit also requires
+    the questions' date tokens to match exactly.
+    """
+    
+    def __init__(self, maxsize: int = CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.generation = None
+        self._vectors = None
+        self._payloads = []
+        self._tokens = []
+    
+    @staticmethod
+    def _normalize(vector: List[float]) -> np.ndarray:
+        """Return the vector as a unit-length float32 array."""
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+    
+    def _reset_if_stale(self, generation: int):
+        """Drop all entries when the indexed documents have changed."""
+        if generation != self.generation:
+            self.generation = generation
+            self._vectors = None
+            self._payloads = []
+            self._tokens = []
+    
+    @staticmethod
+    def date_tokens(question: str) -> Tuple[str, ...]:
+        """Return the numbers and calendar words in a question, in order."""
+        return tuple(_DATE_TOKEN_RE.findall(question.lower()))
+    
+    def lookup(self, vector: List[float], tokens: Tuple[str, ...], generation: int) -> Optional[Dict[str, Any]]:
+        """Return the payload of the most similar past question above the threshold, if any."""
+        self._reset_if_stale(generation)
+        if not self._payloads:
+            return None
+        
+        scores = self._vectors @ self._normalize(vector)
+        # Questions about a different date or number can never match
+        same_tokens = np.fromiter((t == tokens for t in self._tokens), dtype=bool, count=len(self._tokens))
+        scores = np.where(same_tokens, scores, -np.inf)
+        best = int(np.argmax(scores))
+        if scores[best] >= self.threshold:
+            return self._payloads[best]
+        return None
+    
+    def add(self, vector: List[float], tokens: Tuple[str, ...], payload: Dict[str, Any], generation: int):
+        """Store a payload for a question embedding, evicting the oldest entry when full."""
+        self._reset_if_stale(generation)
+        row = self._normalize(vector)[np.newaxis, :]
+        self._vectors = row if self._vectors is None else np.vstack([self._vectors, row])
+        self._payloads.append(payload)
+        self._tokens.append(tokens)
+        
+        if len(self._payloads) > self.maxsize:
+            self._vectors = self._vectors[1:]
+            self._payloads.pop(0)
+            self._tokens.pop(0)
+
+
+# Content words for the containment check: numbers, and words long enough not to be
+# function words a grammar fix might swap out ("was" -> "were")
+_CONTENT_WORD_RE = re.compile(r"\d+|\w{4,}")
+
+
+def _word_containment(original: str, rewritten: str) -> float:
+    """Share of the original's lowercased content words that also appear in the rewritten string"""
+    words_original = set(_CONTENT_WORD_RE.findall(original.lower()))
+    if not words_original:
+        return 0.0
+    words_rewritten = set(_CONTENT_WORD_RE.findall(rewritten.lower()))
+    return len(words_original & words_rewritten) / len(words_original)
+
+
+def _needs_enhancement(question: str) -> bool:
+    """Whether a question is long or vague enough to be worth an LLM rewrite"""
+    if len(question) >= ENHANCEMENT_MIN_LENGTH:
+        return True
+    words = question.lower().replace("?", " ").replace(",", " ").split()
+    return any(word in _AMBIGUOUS_WORDS for word in words)
+
+
+def _normalize_question(question: str) -> str:
+    """Normalize a question for exact-match cache lookups"""
+    return question.strip().lower()
+
 
 class ChatService:
     def __init__(self):
@@ -30,6 +173,8 @@ class ChatService:
 
             Original question: {question}
             """
+        # Split around the placeholder once so each prompt is a plain concatenation
+        self._enh_prefix, _, self._enh_suffix = self.enhancement_template.partition("{question}")
 
 
         
@@ -51,12 +196,20 @@ class ChatService:
             input_variables=["context", "question"]
         )
         
+        # Caches for enhanced queries and full answers, keyed by normalized question
+        self.enhancement_cache = LRUCache()
+        self.answer_cache = LRUCache()
+        self.semantic_cache = SemanticCache()
+        
+        # Counts of enhanced vs. skipped questions, for comparing answer quality
+        self.enhancement_stats = {"enhanced": 0, "skipped": 0}
+        
         self.qa_chain = None
         self._setup_qa_chain()
     
     def _setup_qa_chain(self):
         """Setup the QA chain"""
-        retriever = vector_store_service.get_retriever()
+        retriever = get_vector_store_service().get_retriever()
         if retriever:
             self.qa_chain = RetrievalQA.from_chain_type(
                 llm=self.llm,
@@ -66,59 +219,156 @@ class ChatService:
                 return_source_documents=True
             )
     
+    def warm_up(self):
+        """Build the QA chain if the vector store was not ready at import"""
+        if not self.qa_chain:
+            self._setup_qa_chain()
+    
     async def enhance_question(self, question: str) -> Dict[str, str]:
         """Enhance the user's question for better retrieval and response"""
+        cache_key = _normalize_question(question)
+        cached = self.enhancement_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        # Short, unambiguous questions retrieve well without a rewrite
+        if not _needs_enhancement(question):
+            self.enhancement_stats["skipped"] += 1
+            return question
+        
         try:
             # Create a prompt for enhancement
-            prompt = self.enhancement_template.format(question=question)
+            prompt = self._enh_prefix + question + self._enh_suffix
             
             # Get enhanced query from LLM
             response = await self.llm.ainvoke(prompt)
             
             # Parse the response
             enhanced = response.content
+            self.enhancement_stats["enhanced"] += 1
+            self.enhancement_cache.set(cache_key, enhanced)
             return enhanced
                 
         except Exception as e:
             logger.error(f"Error enhancing question: {e}")
             return question
     
-    async def get_answer(self, question: str) -> Dict[str, Any]:
-        """Get an answer for the given question using enhanced retrieval"""
+    async def _embed_question(self, question: str) -> Optional[List[float]]:
+        """Embed the raw question for the semantic cache, or return None on failure"""
+        try:
+            return await get_vector_store_service().embeddings.aembed_query(question)
+        except Exception as e:
+            logger.warning(f"Error embedding question for semantic cache: {e}")
+            return None
+    
+    @staticmethod
+    def _collect_sources(documents) -> List[Dict[str, Any]]:
+        """Extract and format sources, one per file in retrieval order"""
+        sources = {}
+        add_source = sources.setdefault
+        for doc in documents:
+            metadata = doc.metadata
+            filename = metadata.get("filename")
+            if filename:
+                add_source(filename, {
+                    "filename": filename,
+                    "pdf_path": metadata.get("pdf_path")
+                })
+        return list(sources.values())
+    
+    async def _answer_from_documents(self, documents, question: str) -> Dict[str, Any]:
+        """Answer a question from already-retrieved documents, in the QA chain's result shape"""
+        # Same prompt as the "stuff" QA chain, so answers match a full chain run
+        context = "\n\n".join(doc.page_content for doc in documents)
+        prompt = self.prompt_template.format(context=context, question=question)
+        response = await self.llm.ainvoke(prompt)
+        return {"result": response.content, "source_documents": documents}
+    
+    async def _enhanced_retrieval(self, question: str) -> Tuple[str, Dict[str, Any]]:
+        """Enhance the question and answer it, returning the enhanced query and chain-shaped result"""
+        retriever = self.qa_chain.retriever
+        
+        # Step 1: Enhance the question while speculatively retrieving for the raw question.
+        # Only retrieval is speculative, so a discarded guess never costs an LLM call
+        enhance_task = asyncio.create_task(self.enhance_question(question))
+        spec_task = asyncio.create_task(retriever.ainvoke(question))
+        try:
+            enhanced = await enhance_task
+        except BaseException:
+            spec_task.cancel()
+            raise
+        logger.info(f"Enhanced query for retrieval: {enhanced}")
+        
+        # Step 2: Keep the speculative documents if the enhanced query still contains the
+        # question's own words, otherwise retrieve again with the enhanced query
+        if enhanced == question or _word_containment(question, enhanced) >= SPECULATIVE_OVERLAP_THRESHOLD:
+            logger.info("Using speculative retrieval for the raw question")
+            documents = await spec_task
+        else:
+            spec_task.cancel()
+            documents = await retriever.ainvoke(enhanced)
+        
+        # Step 3: Run the LLM once on whichever documents were kept
+        return enhanced, await self._answer_from_documents(documents, enhanced)
+    
+    async def _plain_retrieval(self, question: str) -> Tuple[str, Dict[str, Any]]:
+        """Run the QA chain on the question as-is, in the same shape as _enhanced_retrieval"""
+        return question, await self.qa_chain.ainvoke({"query": question})
+    
+    async def get_answer(self, question: str, skip_enhancement: bool = False) -> Dict[str, Any]:
+        """
+        Get an answer for the given question using enhanced retrieval
+        
+        Args:
+            question: The user's question
+            skip_enhancement: Retrieve with the question as-is, for callers that send well-formed queries
+        """
         if not self.qa_chain:
             return {
                 "answer": "The system is not ready. Please try again later.",
                 "sources": []
             }
         
+        # Answers depend on the indexed documents, so include the ingestion generation in the key
+        generation = get_vector_store_service().generation
+        cache_key = (generation, _normalize_question(question))
+        cached = self.answer_cache.get(cache_key)
+        if cached is not None:
+            logger.info("Answer cache hit")
+            return cached
+        
+        # Embed the question for the semantic cache while retrieval and answering get going
+        tokens = self.semantic_cache.date_tokens(question)
+        embed_task = asyncio.create_task(self._embed_question(question))
+        if skip_enhancement:
+            self.enhancement_stats["skipped"] += 1
+            answer_task = asyncio.create_task(self._plain_retrieval(question))
+        else:
+            answer_task = asyncio.create_task(self._enhanced_retrieval(question))
+        
         try:
-            # Step 1: Enhance the question
-            enhanced = await self.enhance_question(question)
-            logger.info(f"Enhanced query for retrieval: {enhanced}")
+            # Reuse the answer to a previously asked paraphrase of this question. The
+            # embedding returns well before the answer, so a hit still skips the final LLM call
+            question_vector = await embed_task
+            if question_vector is not None:
+                cached = self.semantic_cache.lookup(question_vector, tokens, generation)
+                if cached is not None:
+                    logger.info("Semantic cache hit")
+                    answer_task.cancel()
+                    self.answer_cache.set(cache_key, cached)
+                    return cached
             
-            # Step 2: Use enhanced query for retrieval
-            result = self.qa_chain.invoke({
-                "query": enhanced
-            })
+            enhanced, result = await answer_task
             
-            # Extract and format sources
-            sources = []
-            if "source_documents" in result:
-                seen_files = set()
-                for doc in result["source_documents"]:
-                    filename = doc.metadata.get("filename", "Unknown")
-                    if filename not in seen_files:
-                        sources.append({
-                            "filename": filename,
-                            "pdf_path": doc.metadata.get("pdf_path")
-                        })
-                        seen_files.add(filename)
-            
-            return {
+            response = {
                 "answer": result.get("result", "I couldn't find a good answer."),
-                "sources": sources,
+                "sources": self._collect_sources(result.get("source_documents", ())),
                 "enhanced_question": enhanced  # For debugging
             }
+            self.answer_cache.set(cache_key, response)
+            if question_vector is not None:
+                self.semantic_cache.add(question_vector, tokens, response, generation)
+            return response
             
         except Exception as e:
             logger.error(f"Error getting answer: {e}", exc_info=True)
@@ -126,6 +376,50 @@ class ChatService:
                 "answer": "Sorry, I encountered an error while processing your request.",
                 "sources": []
             }
+        finally:
+            # Don't leave the LLM call running if the request itself was cancelled
+            answer_task.cancel()
+    
+    async def stream_answer(self, question: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream an answer for the given question as it is generated
+        
+        Retrieval runs up front, then answer tokens are yielded as the LLM produces them.
+        
+        Yields:
+            {"type": "token", "content": ...} events, then one {"type": "sources", "sources": [...]} event
+        """
+        if not self.qa_chain:
+            yield {"type": "token", "content": "The system is not ready. Please try again later."}
+            yield {"type": "sources", "sources": []}
+            return
+        
+        try:
+            enhanced = await self.enhance_question(question)
+            logger.info(f"Enhanced query for streaming retrieval: {enhanced}")
+            
+            # Same retrieval and prompt as the "stuff" QA chain, but with a streamed LLM call
+            documents = await self.qa_chain.retriever.ainvoke(enhanced)
+            context = "\n\n".join(doc.page_content for doc in documents)
+            prompt = self.prompt_template.format(context=context, question=enhanced)
+            
+            async for chunk in self.llm.astream(prompt):
+                if chunk.content:
+                    yield {"type": "token", "content": chunk.content}
+            
+            yield {"type": "sources", "sources": self._collect_sources(documents)}
+            
+        except Exception as e:
+            logger.error(f"Error streaming answer: {e}", exc_info=True)
+            yield {"type": "error", "content": "Sorry, I encountered an error while processing your request."}
+
+# Global instance, created on first use so importing this module stays cheap
+_instance: Optional[ChatService] = None
+
 
-# Global instance
-chat_service = ChatService()
\ No newline at end of file
+def get_chat_service() -> ChatService:
+    """Return the shared ChatService, creating it on first call"""
+    global _instance
+    if _instance is None:
+        _instance = ChatService()
+    return _instance
\ No newline at end of file
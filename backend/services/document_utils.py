@@ -5,11 +5,61 @@ This module centralizes common functionality to reduce code duplication.
 
 import openpyxl
 import os
+from functools import lru_cache
+import multiprocessing
 from typing import List, Dict, Any, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
 
+# Supported extensions, precomputed as tuples for str.endswith
+_PDF_EXT = ('.pdf',)
+_EXCEL_EXT = ('.xlsx', '.xls')
+_ALL_EXT = _PDF_EXT + _EXCEL_EXT
+_EXT_BY_TYPE = {'pdf': _PDF_EXT, 'excel': _EXCEL_EXT}
+
+# Start method for every process pool. tabula runs the JVM in-process through jpype,
+# and a JVM does not survive fork, so workers are spawned fresh instead
+POOL_MP_CONTEXT = multiprocessing.get_context("spawn")
+
+
+# Marker cell text after which a sheet's rows are extracted
+_NOTES_MARKER = "additional notes:"
+
+
+def _extract_rows_after_marker(rows) -> List[List]:
+    """
+    Collect the non-empty rows that follow the "additional notes:" marker row.
+    
+    Args:
+        rows: Iterable of row value tuples, e.g. from iter_rows(values_only=True)
+        
+    Returns:
+        List of extracted data rows with empty cells removed
+    """
+    rows = iter(rows)
+    
+    # Scan for the marker, stopping at the first matching cell
+    for row in rows:
+        found = False
+        for cell in row:
+            if isinstance(cell, str) and _NOTES_MARKER in cell.lower():
+                found = True
+                break
+        if found:
+            break
+    else:
+        return []
+    
+    # Append rows after the "additional notes" cell, skipping empty ones
+    extracted_data = []
+    for row in rows:
+        filtered_row = [cell for cell in row if cell is not None]
+        if filtered_row:
+            extracted_data.append(filtered_row)
+    return extracted_data
+
+
 def extract_info_from_excel(wb: openpyxl.Workbook) -> List[List]:
     """
     Extract information from Excel workbook after "additional notes:" marker.
@@ -26,23 +76,45 @@ def extract_info_from_excel(wb: openpyxl.Workbook) -> List[List]:
     # Iterate through all sheets
     for sheet_name in wb.sheetnames:
         sheet = wb[sheet_name]
-        found = False
+        extracted_data.extend(_extract_rows_after_marker(sheet.iter_rows(values_only=True)))
+    
+    return extracted_data
+
+
+def extract_info_from_tables(tables: List[List[List]]) -> List[List]:
+    """
+    Extract information after the "additional notes:" marker from in-memory tables.
+    Each table is scanned like one worksheet, so results match extracting from the
+    same tables written to an Excel file.
+    
+    Args:
+        tables: Tables as lists of rows, e.g. as returned by the PDF table extractor
         
-        # Iterate through all cells in the sheet
-        for row in sheet.iter_rows(values_only=True):
-            if found:
-                # Append rows after the "additional notes" cell
-                filtered_row = [cell for cell in row if cell is not None]
-                if filtered_row:  # Only add non-empty rows
-                    extracted_data.append(filtered_row)
-            else:
-                # Check for "additional notes" in any cell of the row (case-sensitive)
-                if any(cell and isinstance(cell, str) and "additional notes:" in cell.lower() for cell in row):
-                    found = True
+    Returns:
+        List of extracted data rows
+    """
+    extracted_data = []
+    
+    for table in tables:
+        extracted_data.extend(_extract_rows_after_marker(table))
     
     return extracted_data
 
 
+# Splitters hold no per-call state, so one shared instance of each is reused
+_DEFAULT_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=1000,
+    chunk_overlap=200,
+    separators=["\n\n", "\n", " | ", " ", ""]
+)
+
+_ENTRY_SPLITTER = RecursiveCharacterTextSplitter(
+    chunk_size=600,       # Smaller chunks to preserve entry boundaries
+    chunk_overlap=50,     # Minimal overlap to avoid duplicating entries
+    separators=["\n\n", "\n", " | ", " ", ""]  # Prioritize line breaks
+)
+
+
 def get_default_text_splitter() -> RecursiveCharacterTextSplitter:
     """
     Get the default text splitter configuration used across the application.
@@ -50,11 +122,7 @@ def get_default_text_splitter() -> RecursiveCharacterTextSplitter:
     Returns:
         RecursiveCharacterTextSplitter: Configured text splitter
     """
-    return RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        separators=["\n\n", "\n", " | ", " ", ""]
-    )
+    return _DEFAULT_SPLITTER
 
 
 def get_entry_based_text_splitter() -> RecursiveCharacterTextSplitter:
@@ -65,11 +133,7 @@ def get_entry_based_text_splitter() -> RecursiveCharacterTextSplitter:
     Returns:
         RecursiveCharacterTextSplitter: Configured text splitter for entries
     """
-    return RecursiveCharacterTextSplitter(
-        chunk_size=600,       # Smaller chunks to preserve entry boundaries
-        chunk_overlap=50,     # Minimal overlap to avoid duplicating entries
-        separators=["\n\n", "\n", " | ", " ", ""]  # Prioritize line breaks
-    )
+    return _ENTRY_SPLITTER
 
 
 def convert_extracted_data_to_content(extracted_data: List[List]) -> str:
@@ -82,7 +146,7 @@ def convert_extracted_data_to_content(extracted_data: List[List]) -> str:
     Returns:
         str: Formatted text content
     """
-    return "\n".join([" | ".join(map(str, row)) for row in extracted_data])
+    return "\n".join(" | ".join(map(str, row)) for row in extracted_data)
 
 
 def create_document_from_content(content: str, filename: str, source: str, 
@@ -120,12 +184,12 @@ def get_smart_text_splitter(content: str) -> RecursiveCharacterTextSplitter:
     Returns:
         RecursiveCharacterTextSplitter: Optimal splitter for the content
     """
-    # Analyze content characteristics
-    lines = content.split('\n')
-    avg_line_length = sum(len(line) for line in lines) / len(lines) if lines else 0
+    # Analyze content characteristics without splitting it into a list of lines
+    line_count = content.count('\n') + 1
+    avg_line_length = (len(content) - (line_count - 1)) / line_count
     
     # If content has many short lines (typical of entry-based data)
-    if len(lines) > 5 and avg_line_length < 150:
+    if line_count > 5 and avg_line_length < 150:
         return get_entry_based_text_splitter()
     else:
         return get_default_text_splitter()
@@ -191,6 +255,7 @@ def create_documents_from_excel_sheets(extracted_data: List[List], filename: str
     return text_splitter.split_documents(documents)
 
 
+@lru_cache(maxsize=1)
 def get_supported_file_extensions() -> Dict[str, List[str]]:
     """
     Get supported file extensions by category.
@@ -199,9 +264,9 @@ def get_supported_file_extensions() -> Dict[str, List[str]]:
         Dict mapping file categories to their extensions
     """
     return {
-        'pdf': ['.pdf'],
-        'excel': ['.xlsx', '.xls'],
-        'all_supported': ['.pdf', '.xlsx', '.xls']
+        'pdf': list(_PDF_EXT),
+        'excel': list(_EXCEL_EXT),
+        'all_supported': list(_ALL_EXT)
     }
 
 
@@ -216,12 +281,9 @@ def is_supported_file(filename: str, file_type: Optional[str] = None) -> bool:
     Returns:
         bool: True if file is supported
     """
-    extensions = get_supported_file_extensions()
-    
     if file_type:
-        return filename.lower().endswith(tuple(extensions.get(file_type, [])))
-    else:
-        return filename.lower().endswith(tuple(extensions['all_supported']))
+        return filename.lower().endswith(_EXT_BY_TYPE.get(file_type, ()))
+    return filename.lower().endswith(_ALL_EXT)
 
 
 def get_file_type(filename: str) -> Optional[str]:
@@ -234,11 +296,11 @@ def get_file_type(filename: str) -> Optional[str]:
     Returns:
         str: File type ('pdf', 'excel') or None if unsupported
     """
-    extensions = get_supported_file_extensions()
+    lowered = filename.lower()
     
-    if filename.lower().endswith(tuple(extensions['pdf'])):
+    if lowered.endswith(_PDF_EXT):
         return 'pdf'
-    elif filename.lower().endswith(tuple(extensions['excel'])):
+    elif lowered.endswith(_EXCEL_EXT):
         return 'excel'
     else:
         return None
@@ -0,0 +1,109 @@
+from langchain_core.embeddings import Embeddings
+from concurrent.futures import Future
+from typing import List, Tuple
+from config import logger
+import asyncio
+import queue
+import threading
+import time
+
+# Maximum number of queries embedded in one upstream request
+EMBED_MAX_BATCH = 32
+
+# How long to wait for more queries before sending a partial batch
+EMBED_MAX_WAIT_SECONDS = 0.010
+
+
+class BatchedQueryEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that coalesces concurrent query embeddings into batched calls.
+
+    Queries are queued and a background thread sends them upstream in groups of up to
+    EMBED_MAX_BATCH, waiting at most EMBED_MAX_WAIT_SECONDS to fill a batch.
+    Document embeddings are already batched by the caller and pass straight through.
+    """
+
+    def __init__(self, inner: Embeddings, max_batch: int = EMBED_MAX_BATCH, max_wait: float = EMBED_MAX_WAIT_SECONDS):
+        self.inner = inner
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def _ensure_worker(self):
+        """Start the batching thread on first use"""
+        if self._worker is None:
+            with self._worker_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        """Drain the queue into batches and resolve each caller's future"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Nothing may escape this loop, or every later query would wait forever
+            try:
+                # Drop queries whose callers gave up; the rest can no longer be cancelled
+                batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+                if batch:
+                    self._resolve(batch)
+            except Exception as e:
+                logger.error(f"Unexpected error in embedding batcher: {e}", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _resolve(self, batch: List[Tuple[str, Future]]):
+        """Embed a batch and settle every future in it, so no caller is left waiting"""
+        try:
+            vectors = self._embed_batch([text for text, _ in batch])
+            if len(vectors) != len(batch):
+                raise RuntimeError(f"Expected {len(batch)} embeddings, got {len(vectors)}")
+        except Exception as e:
+            logger.error(f"Error embedding batch of {len(batch)} queries: {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), vector in zip(batch, vectors):
+            future.set_result(vector)
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of queries, keeping query-side embeddings where the model supports them"""
+        if len(texts) == 1:
+            return [self.inner.embed_query(texts[0])]
+        try:
+            return self.inner.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        except TypeError:
+            return self.inner.embed_documents(texts)
+
+    def _submit(self, text: str) -> Future:
+        """Queue a query for the next batch"""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._submit(text).result()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self._submit(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
@@ -2,17 +2,21 @@ import openpyxl
 from langchain_core.documents import Document
 from typing import List, Optional
 import os
-from .pdf_processor import PDFProcessor
+from .pdf_processor import PDFProcessor, init_pdf_worker, get_worker_processor
 from .document_utils import (
     extract_info_from_excel,
     create_documents_from_excel_sheets,
     create_documents_from_extracted_data,
     convert_extracted_data_to_content,
-    get_default_text_splitter
+    get_default_text_splitter,
+    collect_files_from_directory,
+    POOL_MP_CONTEXT,
+    get_file_type
 )
+from concurrent.futures import ProcessPoolExecutor
 import uuid
 import shutil
-from config import settings
+from config import settings, logger
 
 
 # Keep the original function name for backward compatibility
@@ -22,13 +26,30 @@ def extract_info(wb):
 
 def process_excel_to_documents(file_path: str) -> List[Document]:
     """Convert Excel file to LangChain documents"""
-    workbook = openpyxl.load_workbook(file_path)
-    extracted_data = extract_info(workbook)
+    # Read-only mode streams rows instead of loading every cell object into memory
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        extracted_data = extract_info(workbook)
+    finally:
+        workbook.close()
     filename = os.path.basename(file_path)
     
     # Use shared utility for document creation
     return create_documents_from_excel_sheets(extracted_data, filename)
 
+def store_pdf(pdf_path: str, filename: str) -> str:
+    """
+    Store a PDF in the uploads directory under a unique name and return that name.
+    Hardlinks the file when possible and falls back to a copy across filesystems.
+    """
+    stored_filename = f"{uuid.uuid4()}_{filename}"
+    stored_path = os.path.join(settings.UPLOADS_DIR, stored_filename)
+    try:
+        os.link(pdf_path, stored_path)
+    except OSError:
+        shutil.copyfile(pdf_path, stored_path)
+    return stored_filename
+
 def process_pdf_folder_to_documents(folder_path: str, max_files: Optional[int] = None) -> List[Document]:
     """
     Process all PDF files in a folder, convert to Excel, extract data, and create LangChain documents.
@@ -41,17 +62,14 @@ def process_pdf_folder_to_documents(folder_path: str, max_files: Optional[int] =
         List[Document]: List of LangChain documents from all processed PDFs
     """
     processor = PDFProcessor()
-    extracted_data_list = processor.process_pdf_folder(folder_path, max_files)
     
     all_documents = []
     
-    for filename, extracted_data in extracted_data_list:
+    # Build documents as each PDF finishes instead of holding every file's rows first
+    for filename, extracted_data in processor.iter_process_pdf_folder(folder_path, max_files):
         if extracted_data:
             # Use shared utility for document creation
-            stored_filename = f"{uuid.uuid4()}_{filename}"
-            stored_path = os.path.join(settings.UPLOADS_DIR, stored_filename)
-            original_pdf_path = os.path.join(folder_path, filename)
-            shutil.copy2(original_pdf_path, stored_path)
+            stored_filename = store_pdf(os.path.join(folder_path, filename), filename)
             documents = create_documents_from_extracted_data(
                 extracted_data, 
                 filename, 
@@ -62,9 +80,35 @@ def process_pdf_folder_to_documents(folder_path: str, max_files: Optional[int] =
     
     return all_documents
 
+def _process_file_to_documents(file_path: str) -> List[Document]:
+    """
+    Process a single PDF or Excel file into documents.
+    Runs inside a worker process, so it must stay a module-level function.
+    """
+    filename = os.path.basename(file_path)
+    try:
+        if get_file_type(filename) == 'pdf':
+            success, extracted_data, _ = get_worker_processor().process_single_pdf(file_path)
+            if not (success and extracted_data):
+                return []
+            
+            stored_filename = store_pdf(file_path, filename)
+            return create_documents_from_extracted_data(
+                extracted_data, 
+                filename, 
+                "pdf_extraction", 
+                {"original_format": "pdf", "pdf_path": stored_filename}
+            )
+        
+        return process_excel_to_documents(file_path)
+    except Exception as e:
+        logger.error(f"Error processing file {filename}: {str(e)}")
+        return []
+
 def process_mixed_folder_to_documents(folder_path: str, max_files: Optional[int] = None) -> List[Document]:
     """
     Process a folder containing both PDF and Excel files, extracting data from both.
+    Files are parsed in parallel on a process pool.
     
     Args:
         folder_path (str): Path to folder containing PDF and/or Excel files
@@ -73,30 +117,14 @@ def process_mixed_folder_to_documents(folder_path: str, max_files: Optional[int]
     Returns:
         List[Document]: List of LangChain documents from all processed files
     """
-    all_documents = []
-    processed_count = 0
-    
-    # Process PDF files first
-    pdf_docs = process_pdf_folder_to_documents(folder_path, max_files)
-    all_documents.extend(pdf_docs)
-    processed_count += len([doc for doc in pdf_docs if doc.metadata.get("source") == "pdf_extraction"])
+    file_paths = collect_files_from_directory(folder_path, max_files)
+    if not file_paths:
+        return []
     
-    # Process existing Excel files
-    if not max_files or processed_count < max_files:
-        remaining_files = max_files - processed_count if max_files else None
-        excel_count = 0
-        
-        for filename in os.listdir(folder_path):
-            if remaining_files and excel_count >= remaining_files:
-                break
-                
-            if filename.lower().endswith('.xlsx') or filename.lower().endswith('.xls'):
-                file_path = os.path.join(folder_path, filename)
-                try:
-                    excel_docs = process_excel_to_documents(file_path)
-                    all_documents.extend(excel_docs)
-                    excel_count += 1
-                except Exception as e:
-                    print(f"Error processing Excel file {filename}: {str(e)}")
+    all_documents = []
+    with ProcessPoolExecutor(max_workers=min(len(file_paths), os.cpu_count() or 1),
+                             initializer=init_pdf_worker, mp_context=POOL_MP_CONTEXT) as pool:
+        for documents in pool.map(_process_file_to_documents, file_paths):
+            all_documents.extend(documents)
     
-    return all_documents
\ No newline at end of file
+    return all_documents
@@ -1,11 +1,148 @@
 import os
-import pandas as pd
+import hashlib
+import json
+import shutil
 import openpyxl
 import tabula
-from typing import List, Tuple, Optional
+from typing import Iterable, Iterator, List, Tuple, Optional
 from pathlib import Path
-from .document_utils import extract_info_from_excel, safe_filename_for_excel_sheet
-from config import logger
+from functools import lru_cache
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from .document_utils import POOL_MP_CONTEXT, extract_info_from_excel, extract_info_from_tables, safe_filename_for_excel_sheet
+from config import settings, logger
+
+# Suffix tuple for str.endswith checks on lowercased filenames
+_PDF_SUFFIX = ('.pdf',)
+
+# Read PDFs in 1 MiB chunks when hashing them for the extraction cache
+HASH_CHUNK_SIZE = 1 << 20
+
+# Part of every extraction cache key; bump it whenever extraction logic changes the rows
+PDF_CACHE_VERSION = 2
+
+# Extraction cache entries kept on disk; the least recently used are pruned beyond this
+PDF_CACHE_MAX_ENTRIES = 2000
+
+
+def _file_sha256(path: str) -> str:
+    """Return the hex SHA-256 digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_cached_extraction(digest: str) -> Optional[List[List]]:
+    """Return the cached rows for a PDF digest, or None on a miss"""
+    rows_path = os.path.join(settings.PDF_CACHE_DIR, f"{digest}.json")
+    try:
+        with open(rows_path, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable PDF cache entry {rows_path}: {e}")
+        return None
+    
+    # Touch the entry so pruning removes the least recently used ones first
+    try:
+        os.utime(rows_path)
+    except OSError:
+        pass
+    return rows
+
+
+def _restore_cached_excel(digest: str, excel_output_path: str) -> bool:
+    """Copy the cached Excel file for a PDF digest to excel_output_path, returning whether it existed"""
+    cached_excel = os.path.join(settings.PDF_CACHE_DIR, f"{digest}.xlsx")
+    try:
+        shutil.copyfile(cached_excel, excel_output_path)
+        return True
+    except OSError:
+        return False
+
+
+def _prune_extraction_cache(max_entries: int = PDF_CACHE_MAX_ENTRIES):
+    """Delete the least recently used cache entries beyond max_entries"""
+    with os.scandir(settings.PDF_CACHE_DIR) as entries:
+        rows_files = [
+            (entry.stat().st_mtime, entry.path) for entry in entries
+            if entry.is_file() and entry.name.endswith('.json')
+        ]
+    if len(rows_files) <= max_entries:
+        return
+    
+    rows_files.sort()
+    for _, rows_path in rows_files[:len(rows_files) - max_entries]:
+        base = rows_path[:-len('.json')]
+        for path in (rows_path, base + '.xlsx'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def _store_cached_extraction(digest: str, extracted_data: List[List], excel_output_path: Optional[str] = None):
+    """Cache a PDF's extracted rows, and its Excel file if one was written, writing each file atomically"""
+    try:
+        os.makedirs(settings.PDF_CACHE_DIR, exist_ok=True)
+        base = os.path.join(settings.PDF_CACHE_DIR, digest)
+        
+        # Write to per-process temp names, then rename so readers never see partial files
+        tmp_suffix = f".{os.getpid()}.tmp"
+        if excel_output_path:
+            shutil.copyfile(excel_output_path, base + ".xlsx" + tmp_suffix)
+            os.replace(base + ".xlsx" + tmp_suffix, base + ".xlsx")
+        # Cell values are strings and numbers; anything else is stored as its text
+        with open(base + ".json" + tmp_suffix, 'w', encoding='utf-8') as f:
+            json.dump(extracted_data, f, default=str)
+        os.replace(base + ".json" + tmp_suffix, base + ".json")
+        
+        _prune_extraction_cache()
+    except Exception as e:
+        logger.warning(f"Could not cache extraction for digest {digest}: {e}")
+
+
+def _fast_write(path: str, sheets: Iterable[Tuple[str, List[List]]]):
+    """
+    Write rows to an .xlsx file with openpyxl's write-only (streaming) workbook.
+    
+    Args:
+        path: Output Excel file path
+        sheets: (sheet_name, rows) pairs, written in order
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    for sheet_name, rows in sheets:
+        ws = wb.create_sheet(sheet_name)
+        for row in rows:
+            ws.append(row)
+    
+    # Save under a temporary name and rename into place, so a failed or concurrent
+    # write never leaves a truncated workbook at the destination
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        wb.save(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _clean_row(cells: Iterable) -> List:
+    """Map blank cell text to None so blank cells read the same as empty Excel cells"""
+    return [cell if cell != "" else None for cell in cells]
+
+
+@lru_cache(maxsize=64)
+def _count_pdfs(folder_path: str, mtime_ns: int) -> int:
+    """Count the PDF files in a folder; mtime_ns is only part of the cache key"""
+    with os.scandir(folder_path) as entries:
+        return sum(1 for entry in entries
+                   if entry.name.lower().endswith(_PDF_SUFFIX) and entry.is_file())
+
 
 class PDFProcessor:
     """
@@ -16,47 +153,105 @@ class PDFProcessor:
     def __init__(self):
         self.supported_extensions = ['.pdf']
         self.output_extension = '.xlsx'
+        self.extractor = settings.PDF_EXTRACTOR.lower()
     
-    def convert_pdf_to_excel(self, pdf_file: str, output_file: str) -> bool:
+    def _read_tables(self, pdf_file: str) -> List[List[List]]:
         """
-        Convert a single PDF file to Excel format using tabula-py.
+        Extract all tables from a PDF with the configured extractor.
         
         Args:
             pdf_file (str): Path to the input PDF file
-            output_file (str): Path to the output Excel file
             
         Returns:
-            bool: True if conversion successful, False otherwise
+            List of tables, each a list of rows of cell values, header row first
         """
-        try:
-            logger.info(f"Converting PDF: {pdf_file} to Excel: {output_file}")
+        if self.extractor == "pdfplumber":
+            # Imported lazily so the default tabula setup doesn't need pdfplumber installed
+            import pdfplumber
+            
+            with pdfplumber.open(pdf_file) as pdf:
+                return [
+                    [_clean_row(row) for row in table]
+                    for page in pdf.pages
+                    for table in page.extract_tables()
+                ]
+        
+        # JSON output hands back the cell text directly, skipping tabula's pandas
+        # DataFrame construction. With jpype installed, tabula keeps one JVM per
+        # process and reuses it across calls instead of spawning java for every file
+        tables = tabula.read_pdf(
+            pdf_file, 
+            pages='all', 
+            multiple_tables=True, 
+            output_format='json'
+        )
+        return [
+            [_clean_row(cell["text"] for cell in row) for row in table["data"]]
+            for table in tables
+        ]
+    
+    def extract_tables(self, pdf_file: str) -> Optional[List[List[List]]]:
+        """
+        Extract the non-empty tables from a PDF into memory.
+        
+        Args:
+            pdf_file (str): Path to the input PDF file
             
-            # Extract tables from the PDF
-            tables = tabula.read_pdf(
-                pdf_file, 
-                pages='all', 
-                multiple_tables=True, 
-                output_format='dataframe'
-            )
+        Returns:
+            List of tables (empty if none were found), or None if extraction failed.
+            A table counts as empty when it has no rows below its header row.
+        """
+        try:
+            logger.info(f"Extracting tables from PDF: {pdf_file}")
+            return [table for table in self._read_tables(pdf_file) if len(table) > 1]
+        except Exception as e:
+            logger.error(f"Error extracting tables from PDF {pdf_file}: {str(e)}")
+            return None
+    
+    def save_tables_to_excel(self, tables: List[List[List]], output_file: str) -> bool:
+        """
+        Write extracted tables to an Excel file, one sheet per table.
+        
+        Args:
+            tables: Tables returned by extract_tables
+            output_file (str): Path to the output Excel file
             
+        Returns:
+            bool: True if at least one table was written, False otherwise
+        """
+        try:
             # If there are tables extracted, save them to an Excel file
-            if tables and len(tables) > 0:
-                with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                    for i, table in enumerate(tables):
-                        # Clean the table data
-                        if not table.empty:
-                            sheet_name = f"Sheet{i+1}"
-                            table.to_excel(writer, sheet_name=sheet_name, index=False)
+            if tables:
+                _fast_write(output_file, ((f"Sheet{i+1}", table) for i, table in enumerate(tables)))
                 
-                logger.info(f"Successfully converted {pdf_file} to {output_file}")
+                logger.info(f"Saved {len(tables)} tables to {output_file}")
                 return True
             else:
-                logger.warning(f"No tables found in PDF: {pdf_file}")
+                logger.warning(f"No tables to save to {output_file}")
                 return False
                 
         except Exception as e:
-            logger.error(f"Error converting PDF {pdf_file}: {str(e)}")
+            logger.error(f"Error saving tables to {output_file}: {str(e)}")
+            return False
+    
+    def convert_pdf_to_excel(self, pdf_file: str, output_file: str) -> bool:
+        """
+        Convert a single PDF file to Excel format using the configured table extractor.
+        
+        Args:
+            pdf_file (str): Path to the input PDF file
+            output_file (str): Path to the output Excel file
+            
+        Returns:
+            bool: True if conversion successful, False otherwise
+        """
+        tables = self.extract_tables(pdf_file)
+        if not tables:
+            if tables is not None:
+                logger.warning(f"No tables found in PDF: {pdf_file}")
             return False
+        
+        return self.save_tables_to_excel(tables, output_file)
     
     def extract_info_from_excel(self, wb: openpyxl.Workbook) -> List[List]:
         """
@@ -71,99 +266,158 @@ class PDFProcessor:
         """
         return extract_info_from_excel(wb)
     
-    def process_single_pdf(self, pdf_path: str, output_dir: str = None) -> Tuple[bool, Optional[List[List]], str]:
+    def process_single_pdf(self, pdf_path: str, output_dir: str = None,
+                           save_excel: bool = False) -> Tuple[bool, Optional[List[List]], Optional[str]]:
         """
-        Process a single PDF file: convert to Excel and extract data.
+        Process a single PDF file: extract its tables and the data after the notes marker.
         
         Args:
             pdf_path (str): Path to the PDF file
             output_dir (str): Directory to save Excel file (defaults to same as PDF)
+            save_excel (bool): Also write the tables to an Excel file next to the data
             
         Returns:
-            Tuple of (success, extracted_data, excel_file_path)
+            Tuple of (success, extracted_data, excel_file_path); the path is None unless save_excel is set
         """
-        if output_dir is None:
-            output_dir = os.path.dirname(pdf_path)
+        excel_output_path = None
+        if save_excel:
+            if output_dir is None:
+                output_dir = os.path.dirname(pdf_path)
+            
+            # Generate Excel output filename
+            pdf_filename = os.path.basename(pdf_path)
+            excel_filename = os.path.splitext(pdf_filename)[0] + self.output_extension
+            excel_output_path = os.path.join(output_dir, excel_filename)
         
-        # Generate Excel output filename
-        pdf_filename = os.path.basename(pdf_path)
-        excel_filename = os.path.splitext(pdf_filename)[0] + self.output_extension
-        excel_output_path = os.path.join(output_dir, excel_filename)
+        # Reuse the previous extraction if these exact PDF bytes were seen before
+        try:
+            # Extractors and extraction versions produce different rows, so each gets its own cache entries
+            digest = f"v{PDF_CACHE_VERSION}-{self.extractor}-{_file_sha256(pdf_path)}"
+        except OSError as e:
+            logger.warning(f"Could not hash {pdf_path}, skipping extraction cache: {e}")
+            digest = None
+        
+        if digest:
+            cached = _load_cached_extraction(digest)
+            if cached is not None and (not save_excel or _restore_cached_excel(digest, excel_output_path)):
+                logger.info(f"Using cached extraction for {pdf_path}")
+                return True, cached, excel_output_path
         
-        # Convert PDF to Excel
-        conversion_success = self.convert_pdf_to_excel(pdf_path, excel_output_path)
+        # Extract tables in memory and scan them directly, without an Excel round trip
+        tables = self.extract_tables(pdf_path)
+        if not tables:
+            if tables is not None:
+                logger.warning(f"No tables found in PDF: {pdf_path}")
+            return False, None, excel_output_path
         
-        if not conversion_success:
+        if save_excel and not self.save_tables_to_excel(tables, excel_output_path):
             return False, None, excel_output_path
         
         try:
-            # Load the converted Excel file and extract data
-            workbook = openpyxl.load_workbook(excel_output_path)
-            extracted_data = self.extract_info_from_excel(workbook)
-            workbook.close()
-            logger.info(f"Extracted data from Excel file {excel_output_path}")
+            extracted_data = extract_info_from_tables(tables)
+            logger.info(f"Extracted data from PDF {pdf_path}")
+            
+            if digest:
+                _store_cached_extraction(digest, extracted_data, excel_output_path)
             
             return True, extracted_data, excel_output_path
             
         except Exception as e:
-            logger.error(f"Error extracting data from Excel file {excel_output_path}: {str(e)}")
+            logger.error(f"Error extracting data from PDF {pdf_path}: {str(e)}")
             return False, None, excel_output_path
     
-    def process_pdf_folder(self, folder_path: str, max_files: Optional[int] = None, 
-                          output_dir: str = None) -> List[Tuple[str, List[List]]]:
+    def iter_process_pdf_folder(self, folder_path: str, max_files: Optional[int] = None, 
+                                output_dir: str = None, save_excel: bool = False) -> Iterator[Tuple[str, List[List]]]:
         """
-        Process all PDF files in a folder and extract data from them.
+        Process all PDF files in a folder, yielding extracted data as each file finishes.
         
         Args:
             folder_path (str): Path to folder containing PDF files
             max_files (int, optional): Maximum number of files to process
             output_dir (str, optional): Directory to save Excel files (defaults to same as PDFs)
+            save_excel (bool): Also write each PDF's tables to an Excel file in output_dir
             
-        Returns:
-            List of tuples containing (filename, extracted_data) for successful conversions
+        Yields:
+            (filename, extracted_data) tuples for successful conversions, in folder order
         """
         if not os.path.exists(folder_path):
             logger.error(f"Folder path does not exist: {folder_path}")
-            return []
+            return
         
         if output_dir is None:
             output_dir = folder_path
         
         # Ensure output directory exists
-        os.makedirs(output_dir, exist_ok=True)
-        
-        extracted_data_list = []
-        processed_count = 0
+        if save_excel:
+            os.makedirs(output_dir, exist_ok=True)
         
         logger.info(f"Processing PDF files in folder: {folder_path}")
         
-        # Loop over files in the folder
-        for filename in os.listdir(folder_path):
-            # Check file limit
-            if max_files and processed_count >= max_files:
-                logger.info(f"Reached maximum file limit: {max_files}")
-                break
-            
-            file_path = os.path.join(folder_path, filename)
-            
-            # Process only PDF files
-            if filename.lower().endswith('.pdf'):
-                logger.info(f"Processing file {processed_count + 1}: {filename}")
-                
-                success, extracted_data, excel_path = self.process_single_pdf(file_path, output_dir)
-                
-                if success and extracted_data:
-                    extracted_data_list.append((filename, extracted_data))
-                    logger.info(f"Successfully processed: {filename}")
-                else:
-                    logger.warning(f"Failed to process or no data extracted from: {filename}")
+        submitted = 0
+        succeeded = 0
+        pending = deque()
+        workers = os.cpu_count() or 1
+        # Files submitted but not yet yielded; enough to keep every worker busy while the
+        # consumer reads the oldest, without letting finished results pile up
+        window = 2 * workers
+        
+        def settle(future):
+            """Yield a finished file's data if it was extracted"""
+            nonlocal succeeded
+            filename, success, extracted_data = future.result()
+            if success and extracted_data:
+                succeeded += 1
+                logger.info(f"Successfully processed: {filename}")
+                yield filename, extracted_data
+            else:
+                logger.warning(f"Failed to process or no data extracted from: {filename}")
+        
+        # Submit each PDF as soon as the scan finds it, so conversion overlaps the directory walk
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_pdf_worker,
+                                 mp_context=POOL_MP_CONTEXT) as executor:
+            try:
+                # Bind the per-entry lookups once; this loop runs for every entry in the folder
+                submit = executor.submit
+                enqueue = pending.append
+                with os.scandir(folder_path) as entries:
+                    for entry in entries:
+                        if not (entry.name.lower().endswith(_PDF_SUFFIX) and entry.is_file()):
+                            continue
+                        if max_files and submitted >= max_files:
+                            logger.info(f"Reached maximum file limit: {max_files}")
+                            break
+                        # Yield in folder order once the window is full, so only the
+                        # files inside the window are held in memory
+                        if len(pending) >= window:
+                            yield from settle(pending.popleft())
+                        enqueue(submit(_process_pdf_file, entry.path, output_dir, save_excel))
+                        submitted += 1
                 
-                processed_count += 1
+                while pending:
+                    yield from settle(pending.popleft())
+            finally:
+                # A consumer that stops early shouldn't wait for files it will never read
+                for future in pending:
+                    future.cancel()
         
-        logger.info(f"Completed processing {processed_count} PDF files. "
-                   f"Successfully extracted data from {len(extracted_data_list)} files.")
+        logger.info(f"Completed processing {submitted} PDF files. "
+                   f"Successfully extracted data from {succeeded} files.")
+    
+    def process_pdf_folder(self, folder_path: str, max_files: Optional[int] = None, 
+                          output_dir: str = None, save_excel: bool = False) -> List[Tuple[str, List[List]]]:
+        """
+        Process all PDF files in a folder and extract data from them.
         
-        return extracted_data_list
+        Args:
+            folder_path (str): Path to folder containing PDF files
+            max_files (int, optional): Maximum number of files to process
+            output_dir (str, optional): Directory to save Excel files (defaults to same as PDFs)
+            save_excel (bool): Also write each PDF's tables to an Excel file in output_dir
+            
+        Returns:
+            List of tuples containing (filename, extracted_data) for successful conversions
+        """
+        return list(self.iter_process_pdf_folder(folder_path, max_files, output_dir, save_excel))
     
     def get_folder_pdf_count(self, folder_path: str) -> int:
         """
@@ -175,37 +429,36 @@ class PDFProcessor:
         Returns:
             int: Number of PDF files found
         """
-        if not os.path.exists(folder_path):
+        try:
+            mtime_ns = os.stat(folder_path).st_mtime_ns
+        except OSError:
             return 0
         
-        pdf_count = sum(1 for filename in os.listdir(folder_path) 
-                       if filename.lower().endswith('.pdf'))
-        return pdf_count
+        # Adding, removing or renaming entries bumps the folder mtime, which invalidates the cached count
+        return _count_pdfs(folder_path, mtime_ns)
     
-    def save_extracted_data_to_excel(self, extracted_data_list: List[Tuple[str, List[List]]], 
+    def save_extracted_data_to_excel(self, extracted_data_list: Iterable[Tuple[str, List[List]]], 
                                    output_file: str) -> bool:
         """
         Save all extracted data to a consolidated Excel file.
+        Accepts any iterable, so a folder can be streamed in from iter_process_pdf_folder
+        and each sheet written as its file finishes.
         
         Args:
-            extracted_data_list: List of (filename, extracted_data) tuples
+            extracted_data_list: Iterable of (filename, extracted_data) tuples
             output_file: Path to output Excel file
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-                for filename, extracted_data in extracted_data_list:
-                    if extracted_data:
-                        # Convert to DataFrame
-                        df = pd.DataFrame(extracted_data)
-                        
-                        # Create a safe sheet name using shared utility
-                        sheet_name = safe_filename_for_excel_sheet(filename)
-                        
-                        # Write to Excel
-                        df.to_excel(writer, sheet_name=sheet_name, index=False, header=False)
+            # Rows are already lists, so stream them straight into a write-only workbook,
+            # one sheet per file named with the shared safe-sheet-name utility
+            _fast_write(output_file, (
+                (safe_filename_for_excel_sheet(filename), extracted_data)
+                for filename, extracted_data in extracted_data_list
+                if extracted_data
+            ))
             
             logger.info(f"Consolidated data saved to: {output_file}")
             return True
@@ -215,6 +468,35 @@ class PDFProcessor:
             return False
 
 
+# Processor used by the current worker process
+_worker_processor: Optional[PDFProcessor] = None
+
+
+def init_pdf_worker():
+    """Process pool initializer: build the worker's PDFProcessor once, before its first task"""
+    global _worker_processor
+    _worker_processor = PDFProcessor()
+
+
+def get_worker_processor() -> PDFProcessor:
+    """Return the current process's shared PDFProcessor, creating it if the pool had no initializer"""
+    if _worker_processor is None:
+        init_pdf_worker()
+    return _worker_processor
+
+
+def _process_pdf_file(pdf_path: str, output_dir: str, save_excel: bool = False) -> Tuple[str, bool, Optional[List[List]]]:
+    """
+    Process one PDF in a worker process.
+    Must stay a module-level function so the process pool can pickle it.
+    
+    Returns:
+        Tuple of (filename, success, extracted_data)
+    """
+    success, extracted_data, _ = get_worker_processor().process_single_pdf(pdf_path, output_dir, save_excel)
+    return os.path.basename(pdf_path), success, extracted_data
+
+
 # Convenience function that matches the original reference code structure
 def process_pdfs_and_extract_data(folder_path: str, max_files: Optional[int] = None) -> List[List[List]]:
     """
@@ -228,7 +510,7 @@ def process_pdfs_and_extract_data(folder_path: str, max_files: Optional[int] = N
         List of extracted data from all processed files
     """
     processor = PDFProcessor()
-    results = processor.process_pdf_folder(folder_path, max_files)
+    results = processor.iter_process_pdf_folder(folder_path, max_files)
     
     # Return just the extracted data (matching original function signature)
     return [data for filename, data in results]
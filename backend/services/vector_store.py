@@ -1,37 +1,67 @@
 from langchain_qdrant import QdrantVectorStore
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from qdrant_client import QdrantClient
-from qdrant_client.models import Distance, VectorParams
+from qdrant_client.models import (
+    Distance, VectorParams, SearchParams, PointStruct,
+    ScalarQuantization, ScalarQuantizationConfig, ScalarType,
+    HnswConfigDiff, OptimizersConfigDiff
+)
+from services.embedding_batcher import BatchedQueryEmbeddings
 from config import settings, logger
-from typing import List
+from typing import List, Optional
 from langchain_core.documents import Document
+import asyncio
+import uuid
+
+# Size of the HNSW candidate list explored per query; higher is more accurate but slower
+HNSW_SEARCH_EF = 40
+
+# Texts per embedding request during ingestion, and how many requests may run at once
+EMBED_BATCH_SIZE = 100
+EMBED_CONCURRENCY = 8
+
+# HNSW graph parameters for new collections: links per node and build-time candidate list size
+HNSW_M = 16
+HNSW_EF_CONSTRUCT = 128
+
+# Segments are only HNSW-indexed once their vectors exceed this many kilobytes, so bulk uploads aren't re-indexed per batch
+INDEXING_THRESHOLD = 20000
 
 
 class VectorStoreService:
     def __init__(self):
         logger.info("Initializing vector store service...")
-        self.embeddings = GoogleGenerativeAIEmbeddings(
+        # Concurrent question embeddings are coalesced into batched API calls
+        self.embeddings = BatchedQueryEmbeddings(GoogleGenerativeAIEmbeddings(
             model="models/text-embedding-004",
             google_api_key=settings.GOOGLE_API_KEY
-        )
+        ))
         
         # Initialize Qdrant client - supports both local and cloud setups
         if settings.QDRANT_URL:
             # Cloud setup with URL
             self.client = QdrantClient(
                 url=settings.QDRANT_URL,
-                api_key=settings.QDRANT_API_KEY
+                api_key=settings.QDRANT_API_KEY,
+                grpc_port=settings.QDRANT_GRPC_PORT,
+                prefer_grpc=settings.QDRANT_PREFER_GRPC,
+                timeout=settings.QDRANT_TIMEOUT
             )
         else:
             # Local setup with host and port
             logger.info("Using local Qdrant setup")
             self.client = QdrantClient(
                 host=settings.QDRANT_HOST,
-                port=settings.QDRANT_PORT
+                port=settings.QDRANT_PORT,
+                grpc_port=settings.QDRANT_GRPC_PORT,
+                prefer_grpc=settings.QDRANT_PREFER_GRPC,
+                timeout=settings.QDRANT_TIMEOUT
             )
         logger.info("Qdrant client initialized successfully")
         self.collection_name = "building_logs"
         self.vectorstore = None
+        # Bumped on every ingestion so caches built on older search results can be invalidated
+        self.generation = 0
         self._initialize_vectorstore()
     
     def _initialize_vectorstore(self):
@@ -53,8 +83,8 @@ class VectorStoreService:
             
         except Exception as e:
             logger.error(f"Error initializing vector store: {e}")
-            logger.error("Make sure Qdrant is running locally on port 6333")
-            logger.error("You can start Qdrant with Docker: docker run -p 6333:6333 qdrant/qdrant")
+            logger.error("Make sure Qdrant is running locally on ports 6333 (HTTP) and 6334 (gRPC)")
+            logger.error("You can start Qdrant with Docker: docker run -p 6333:6333 -p 6334:6334 qdrant/qdrant")
     
     def _check_qdrant_connection(self):
         """Check if Qdrant is running and accessible"""
@@ -63,7 +93,14 @@ class VectorStoreService:
             collections = self.client.get_collections()
             logger.info(f"Connected to Qdrant successfully. Found {len(collections.collections)} collections.")
         except Exception as e:
-            raise ConnectionError(f"Cannot connect to Qdrant: {e}. Make sure Qdrant is running on {settings.QDRANT_HOST}:{settings.QDRANT_PORT}")
+            transport = (
+                f"gRPC port {settings.QDRANT_GRPC_PORT} (set QDRANT_GRPC_PORT, or QDRANT_PREFER_GRPC=false to use HTTP)"
+                if settings.QDRANT_PREFER_GRPC else f"HTTP port {settings.QDRANT_PORT}"
+            )
+            raise ConnectionError(
+                f"Cannot connect to Qdrant: {e}. Make sure Qdrant is running on {settings.QDRANT_HOST} "
+                f"and reachable on {transport}"
+            )
     
     def _ensure_collection_exists(self):
         """Ensure the collection exists, create if it doesn't"""
@@ -81,7 +118,24 @@ class VectorStoreService:
                     collection_name=self.collection_name,
                     vectors_config=VectorParams(
                         size=768,  # Google text-embedding-004 dimension
-                        distance=Distance.COSINE
+                        distance=Distance.COSINE,
+                        # Full-precision vectors stay on disk for rescoring; the int8 copies are kept in RAM
+                        on_disk=True
+                    ),
+                    # Keep int8 copies of the vectors in RAM for search; originals are used for rescoring
+                    quantization_config=ScalarQuantization(
+                        scalar=ScalarQuantizationConfig(
+                            type=ScalarType.INT8,
+                            always_ram=True
+                        )
+                    ),
+                    hnsw_config=HnswConfigDiff(
+                        m=HNSW_M,
+                        ef_construct=HNSW_EF_CONSTRUCT,
+                        on_disk=False
+                    ),
+                    optimizers_config=OptimizersConfigDiff(
+                        indexing_threshold=INDEXING_THRESHOLD
                     )
                 )
                 logger.info(f"Successfully created collection '{self.collection_name}'")
@@ -91,16 +145,79 @@ class VectorStoreService:
         except Exception as e:
             raise RuntimeError(f"Failed to ensure collection exists: {e}")
     
+    def warm_up(self):
+        """Open the Qdrant connection, retrying initialization if it failed at import"""
+        if self.vectorstore is None:
+            self._initialize_vectorstore()
+            return
+        
+        try:
+            self._check_qdrant_connection()
+        except ConnectionError as e:
+            logger.error(f"Error warming up vector store: {e}")
+    
     def add_documents(self, documents: List[Document]):
         """Add documents to vector store"""
         if self.vectorstore and documents:
             self.vectorstore.add_documents(documents)
+            self.generation += 1
+    
+    async def aadd_documents(self, documents: List[Document]):
+        """
+        Embed documents in concurrent batches and upsert them into the collection.
+        
+        Args:
+            documents: Documents to add; payloads match what QdrantVectorStore reads back
+        """
+        if not (self.vectorstore and documents):
+            return
+        
+        texts = [doc.page_content for doc in documents]
+        semaphore = asyncio.Semaphore(EMBED_CONCURRENCY)
+        
+        async def embed(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.embeddings.aembed_documents(batch)
+        
+        batches = await asyncio.gather(*(
+            embed(texts[start:start + EMBED_BATCH_SIZE])
+            for start in range(0, len(texts), EMBED_BATCH_SIZE)
+        ))
+        vectors = [vector for batch in batches for vector in batch]
+        
+        points = [
+            PointStruct(
+                id=str(uuid.uuid4()),
+                vector=vector,
+                payload={
+                    self.vectorstore.content_payload_key: doc.page_content,
+                    self.vectorstore.metadata_payload_key: doc.metadata
+                }
+            )
+            for doc, vector in zip(documents, vectors)
+        ]
+        
+        # Vectors are already computed, so write them directly instead of re-embedding
+        await asyncio.to_thread(self.client.upsert, collection_name=self.collection_name, points=points)
+        self.generation += 1
     
     def get_retriever(self, k: int = 1):
         """Get retriever for similarity search"""
         if self.vectorstore:
-            return self.vectorstore.as_retriever(search_kwargs={"k": k})
+            # Qdrant indexes vectors with HNSW; bound the per-query graph search explicitly
+            return self.vectorstore.as_retriever(search_kwargs={
+                "k": k,
+                "search_params": SearchParams(hnsw_ef=HNSW_SEARCH_EF)
+            })
         return None
 
-# Global instance
-vector_store_service = VectorStoreService()
\ No newline at end of file
+# Global instance, created on first use so importing this module doesn't connect to Qdrant
+_instance: Optional[VectorStoreService] = None
+
+
+def get_vector_store_service() -> VectorStoreService:
+    """Return the shared VectorStoreService, creating it on first call"""
+    global _instance
+    if _instance is None:
+        _instance = VectorStoreService()
+    return _instance
\ No newline at end of file